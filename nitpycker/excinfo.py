@@ -6,27 +6,15 @@ to be meaningful
 """
 
 
-import sys
-
-import builtins
+import copyreg
 
 
 __author__ = "Benjamin Schubert <ben.c.schubert@gmail.com>"
 
 
-def non_private_exit(code=0):
-    """
-    patch for the builtin quit and exit function to
-    allow to serialize objects that uses them
-
-    :param code: error code with with to exit
-    """
-    # noinspection PyBroadException
-    try:
-        sys.stdin.close()
-    except:
-        pass
-    raise SystemExit(code)
+# types of the frame globals that are kept when freezing a traceback.
+# unittest only needs the keys (e.g. `__unittest`), so anything else is not worth serializing
+SERIALIZABLE_GLOBALS_TYPES = (str, bytes, int, float, bool, type(None))
 
 
 class FrozenFCode:
@@ -35,50 +23,41 @@ class FrozenFCode:
 
     :param f_code: original code object
     """
+    __slots__ = ("co_filename", "co_name")
+
     def __init__(self, f_code):
-        self.__co_filename = f_code.co_filename
-        self.__co_name = f_code.co_name
+        self.co_filename = f_code.co_filename
+        self.co_name = f_code.co_name
 
-    @property
-    def co_filename(self):
-        """ name of the file of the code object """
-        return self.__co_filename
+    def __reduce__(self):
+        return copyreg.__newobj__, (type(self),), (self.co_filename, self.co_name)
 
-    @property
-    def co_name(self):
-        """ name of the code object """
-        return self.__co_name
+    def __setstate__(self, state):
+        self.co_filename, self.co_name = state
 
 
 class FrozenTbFrame:
     """
     Traceback frame that can be serialized
 
-    This will remove some parts of the traceback that are not serializable,
-    so the frozen frame might not be complete.
+    This will only keep globals of simple types, as others might not be
+    serializable, so the frozen frame might not be complete.
 
     :param tb_frame: original traceback frame
     """
+    __slots__ = ("f_globals", "f_code")
+
     def __init__(self, tb_frame):
-        self.__f_globals = tb_frame.f_globals.copy()
-        self.__f_code = FrozenFCode(tb_frame.f_code)
-        to_remove = []
-        for key, item in self.__f_globals.items():
-            if "module" in str(item):
-                to_remove.append(key)
+        self.f_globals = {
+            key: item for key, item in tb_frame.f_globals.items() if isinstance(item, SERIALIZABLE_GLOBALS_TYPES)
+        }
+        self.f_code = FrozenFCode(tb_frame.f_code)
 
-        for key in to_remove:
-            self.__f_globals.pop(key)
+    def __reduce__(self):
+        return copyreg.__newobj__, (type(self),), (self.f_globals, self.f_code)
 
-    @property
-    def f_globals(self):
-        """ globals contained in the frame """
-        return self.__f_globals
-
-    @property
-    def f_code(self):
-        """ code object executed in the frame """
-        return self.__f_code
+    def __setstate__(self, state):
+        self.f_globals, self.f_code = state
 
 
 class FrozenTraceback:
@@ -86,32 +65,75 @@ class FrozenTraceback:
     Traceback that can be serialized
 
     This class lacks some features of the original traceback,
-    they can be implemented on demand
+    they can be implemented on demand.
+
+    The whole chain is frozen iteratively in a single list shared by all
+    its links, so that neither freezing nor pickling recurses on deep tracebacks.
 
     :param tb: original traceback
     """
-    __tb_next = None
+    __slots__ = ("__frames", "__index")
+
+    # the last instruction is not kept, this tells the traceback module not to look for its position
+    tb_lasti = -1
 
     def __init__(self, tb):
-        self.__tb_frame = FrozenTbFrame(tb.tb_frame)
-        self.__tb_lineno = tb.tb_lineno
-        if tb.tb_next is not None:
-            self.__tb_next = FrozenTraceback(tb.tb_next)
+        frames = []
+        while tb is not None:
+            frames.append((FrozenTbFrame(tb.tb_frame), tb.tb_lineno))
+            tb = tb.tb_next
+
+        self.__frames = frames
+        self.__index = 0
+
+    def __reduce__(self):
+        return copyreg.__newobj__, (type(self),), (self.__frames, self.__index)
+
+    def __setstate__(self, state):
+        self.__frames, self.__index = state
+
+    @classmethod
+    def _from_frames(cls, frames, index):
+        """
+        creates a link of an already frozen traceback chain
+
+        :param frames: list of (frame, line number) of the whole chain
+        :param index: index of the link in the chain
+        :return: the traceback starting at the given index
+        """
+        tb = cls.__new__(cls)
+        tb.__frames = frames
+        tb.__index = index
+        return tb
 
     @property
     def tb_frame(self):
         """ traceback frame """
-        return self.__tb_frame
+        return self.__frames[self.__index][0]
 
     @property
     def tb_next(self):
         """ next traceback """
-        return self.__tb_next
+        if self.__index + 1 < len(self.__frames):
+            return self._from_frames(self.__frames, self.__index + 1)
+        return None
+
+    @tb_next.setter
+    def tb_next(self, tb):
+        """
+        cuts the traceback after this link, as unittest does to hide its own frames
+
+        :param tb: the new next traceback, only None is supported
+        """
+        if tb is not None:
+            raise ValueError("A frozen traceback can only be cut, not linked to another traceback")
+
+        del self.__frames[self.__index + 1:]
 
     @property
     def tb_lineno(self):
         """ line number of the traceback """
-        return self.__tb_lineno
+        return self.__frames[self.__index][1]
 
 
 class FrozenExcInfo:
@@ -119,11 +141,21 @@ class FrozenExcInfo:
     Execution information that can be serialized
 
     :param exc_info: original execution information
+    :param include_traceback: whether to freeze the traceback or to drop it
     """
-    def __init__(self, exc_info):
-        builtins.quit = non_private_exit
-        builtins.exit = non_private_exit
-        self.infos = exc_info[:2] + (FrozenTraceback(exc_info[2]),)
+    __slots__ = ("infos",)
+
+    def __init__(self, exc_info, include_traceback=True):
+        if include_traceback:
+            self.infos = exc_info[:2] + (FrozenTraceback(exc_info[2]),)
+        else:
+            self.infos = exc_info[:2] + (None,)
+
+    def __reduce__(self):
+        return copyreg.__newobj__, (type(self),), self.infos
+
+    def __setstate__(self, state):
+        self.infos = state
 
     def __getitem__(self, item):
         return self.infos[item]
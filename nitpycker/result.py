@@ -2,16 +2,21 @@
 Results handler for a multiprocessing setup of unittest.py
 """
 
+import collections
+import copyreg
 import enum
+import sys
 import warnings
+from multiprocessing.reduction import ForkingPickler
+from pickle import PicklingError
 
-import operator
 import queue
 import threading
 import time
 import unittest
 import unittest.case
 import unittest.result
+import unittest.suite
 
 from nitpycker.excinfo import FrozenExcInfo
 
@@ -38,36 +43,153 @@ class SerializationWarning(UserWarning):
     """
 
 
+class ProcessCrashError(Exception):
+    """
+    Error reported for tests whose process stopped before sending their results
+    """
+
+
+def iter_test_cases(test):
+    """
+    iterates over all test cases of a test suite, however nested they are
+
+    :param test: test suite or test case to iterate over
+    :return: generator of all the test cases
+    """
+    if isinstance(test, unittest.TestSuite):
+        for sub_test in test:
+            yield from iter_test_cases(sub_test)
+    else:
+        yield test
+
+
+class TrimmedTest:
+    """
+    Serializable summary of a test, keeping only what test results need to report it
+
+    :param test: the test that was run
+    :param time_taken: time the test took to run
+    """
+    __slots__ = ("test_id", "description", "short_description", "failureException", "time_taken")
+
+    def __init__(self, test: unittest.case.TestCase, time_taken: float):
+        self.test_id = test.id()
+        self.description = str(test)
+        self.short_description = test.shortDescription()
+        self.failureException = test.failureException
+        self.time_taken = time_taken
+
+    def __reduce__(self):
+        return copyreg.__newobj__, (type(self),), (
+            self.test_id, self.description, self.short_description, self.failureException, self.time_taken
+        )
+
+    def __setstate__(self, state):
+        self.test_id, self.description, self.short_description, self.failureException, self.time_taken = state
+
+    def id(self) -> str:
+        """ id of the test """
+        return self.test_id
+
+    # noinspection PyPep8Naming
+    def shortDescription(self) -> str:
+        """ first line of the test's docstring, if any """
+        return self.short_description
+
+    def __str__(self):
+        return self.description
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, self.test_id)
+
+
 class InterProcessResult(unittest.result.TestResult):
     """
     A TestResult implementation to put results in a queue, for another thread to consume
+
+    Results are buffered and sent together when flushed, to serialize them by batches. A batch is sent
+    once it holds results_per_flush results, so that results are not held back for too long on big suites
+    and the results of the last test are sent with the notice that the suite is finished.
+
+    :param result_queue: queue in which to put the results
+    :param index: index of the suite for which results are reported
+    :param tests_count: number of tests in the suite
     """
-    def __init__(self, result_queue: queue.Queue):
+    __slots__ = (
+        "result_queue", "index", "tests_left", "finished", "put_result", "pending_results", "start_time", "stop_time"
+    )
+
+    results_per_flush = 10
+
+    def __init__(self, result_queue: queue.Queue, index: int, tests_count: int):
         super().__init__()
         self.result_queue = result_queue
+        self.index = index
+        self.tests_left = tests_count
+        self.finished = False
+        self.put_result = result_queue.put
+        self.pending_results = []
         self.start_time = self.stop_time = None
 
+    def flush(self, finished=False) -> None:
+        """
+        Sends all results gathered since the last flush to the queue
+
+        :param finished: whether the suite is done running. This is always sent once, to tell that no result is missing
+        """
+        if self.pending_results or (finished and not self.finished):
+            self.send(self.pending_results, finished)
+            self.pending_results = []
+            self.finished = self.finished or finished
+
+    def send(self, results, finished) -> None:
+        """
+        Serializes the given results and puts them in the queue
+
+        :param results: list of results to send
+        :param finished: whether the suite is done running
+        :raise PicklingError: if the results can't be serialized and loaded back
+        """
+        try:
+            message = bytes(ForkingPickler.dumps((self.index, results, finished)))
+            # results that can't be loaded back would only fail in the collector, where nothing can be done anymore
+            ForkingPickler.loads(message)
+        except Exception as exc:
+            raise PicklingError(str(exc)) from exc
+
+        self.put_result(message)
+
     def startTest(self, test: unittest.case.TestCase) -> None:
         """
         Saves the time before starting the test
 
         :param test: the test that is going to be run
         """
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
 
-    def add_result(self, _type, test, exc_info=None):
+    def stopTest(self, test: unittest.case.TestCase) -> None:
+        """
+        Sends the pending results if the suite is done or if enough of them were gathered
+
+        :param test: the test that was run
+        """
+        self.tests_left -= 1
+
+        if not self.tests_left:
+            self.flush(finished=True)
+        elif len(self.pending_results) >= self.results_per_flush:
+            self.flush()
+
+    def add_result(self, _type, test, additional_info=None):
         """
         Adds the given result to the list
 
         :param _type: type of the state of the test (TestState.failure, TestState.error, ...)
         :param test: the test
-        :param exc_info: additional execution information
+        :param additional_info: serializable additional information (frozen execution information, skip reason)
         """
-        if exc_info is not None:
-            exc_info = FrozenExcInfo(exc_info)
-        test.time_taken = time.time() - self.start_time
-        test._outcome = None
-        self.result_queue.put((_type, test, exc_info))
+        time_taken = time.perf_counter() - self.start_time
+        self.pending_results.append((_type.name, TrimmedTest(test, time_taken), additional_info))
 
     def addSuccess(self, test: unittest.case.TestCase) -> None:
         """
@@ -86,7 +208,7 @@ class InterProcessResult(unittest.result.TestResult):
         :param exc_info: tuple of the form (Exception class, Exception instance, traceback)
         """
         # noinspection PyTypeChecker
-        self.add_result(TestState.failure, test, exc_info)
+        self.add_result(TestState.failure, test, FrozenExcInfo(exc_info))
 
     def addError(self, test: unittest.case.TestCase, exc_info: tuple) -> None:
         """
@@ -96,7 +218,7 @@ class InterProcessResult(unittest.result.TestResult):
         :param exc_info: tuple of the form (Exception class, Exception instance, traceback)
         """
         # noinspection PyTypeChecker
-        self.add_result(TestState.error, test, exc_info)
+        self.add_result(TestState.error, test, FrozenExcInfo(exc_info))
 
     def addExpectedFailure(self, test: unittest.case.TestCase, err: tuple) -> None:
         """
@@ -105,8 +227,9 @@ class InterProcessResult(unittest.result.TestResult):
         :param test: the test to save
         :param err: tuple of the form (Exception class, Exception instance, traceback)
         """
+        # the traceback of an expected failure is not printed by unittest, no need to freeze it
         # noinspection PyTypeChecker
-        self.add_result(TestState.expected_failure, test, err)
+        self.add_result(TestState.expected_failure, test, FrozenExcInfo(err, include_traceback=False))
 
     def addUnexpectedSuccess(self, test: unittest.case.TestCase) -> None:
         """
@@ -124,9 +247,8 @@ class InterProcessResult(unittest.result.TestResult):
         :param test: the test to save
         :param reason: the reason why the test was skipped
         """
-        test.time_taken = time.time() - self.start_time
-        test._outcome = None
-        self.result_queue.put((TestState.skipped, test, reason))
+        # noinspection PyTypeChecker
+        self.add_result(TestState.skipped, test, reason)
 
 
 class ResultCollector(threading.Thread, unittest.result.TestResult):
@@ -147,6 +269,15 @@ class ResultCollector(threading.Thread, unittest.result.TestResult):
         unittest.result.TestResult.__init__(self, stream, descriptions, verbosity)
         self.test_results = test_results
 
+        # bound methods of every test results instance, by name, to avoid resolving them for each test
+        self.test_results_methods = {
+            method_name: [getattr(testResult, method_name) for testResult in self.test_results]
+            for method_name in (
+                "addError", "addExpectedFailure", "addFailure", "addSkip", "addSuccess", "addUnexpectedSuccess",
+                "printErrors"
+            )
+        }
+
         for testResult in self.test_results:
             if hasattr(testResult, "separator1"):
                 self.separator1 = testResult.separator1
@@ -158,7 +289,6 @@ class ResultCollector(threading.Thread, unittest.result.TestResult):
                 break
 
         self.result_queue = result_queue
-        self.cleanup = False
         self.showAll = verbosity > 1
         self.dots = verbosity == 1
 
@@ -166,10 +296,25 @@ class ResultCollector(threading.Thread, unittest.result.TestResult):
         self.descriptions = descriptions
 
         self.tests = tests
+        self.finished_suites = set()
+        self.reported_tests = collections.defaultdict(set)
+        # errors that happened while collecting results, by index of the suite, None if it is not known
+        self.collection_errors = {}
+
+        # methods to call for each test state name, all taking the test and its additional information.
+        # states are sent by name, which is cheaper to unpickle than the enum member
+        self.result_handlers = {
+            TestState.success.name: lambda test, _: self.addSuccess(test),
+            TestState.failure.name: self.addFailure,
+            TestState.error.name: self.addError,
+            TestState.skipped.name: self.addSkip,
+            TestState.expected_failure.name: self.addExpectedFailure,
+            TestState.unexpected_success.name: lambda test, _: self.addUnexpectedSuccess(test),
+        }
 
     def end_collection(self) -> None:
         """ Tells the thread that is it time to end """
-        self.cleanup = True
+        self.result_queue.put(None)
 
     def _call_test_results(self, method_name, *args, **kwargs):
         """
@@ -179,9 +324,8 @@ class ResultCollector(threading.Thread, unittest.result.TestResult):
         :param args: arguments to pass to the method
         :param kwargs: keyword arguments to pass to the method
         """
-        method = operator.methodcaller(method_name, *args, **kwargs)
-        for testResult in self.test_results:
-            method(testResult)
+        for method in self.test_results_methods[method_name]:
+            method(*args, **kwargs)
 
     # noinspection PyPep8Naming
     def getDescription(self, test):
@@ -199,14 +343,16 @@ class ResultCollector(threading.Thread, unittest.result.TestResult):
 
     def test_info(self, test):
         """
-        writes test description on the stream used for reporting
+        writes test description on the stream used for reporting, when in verbose mode
 
         :param test: test for which to display information
         """
-        if self.showAll:
-            self.stream.write(self.getDescription(test))
-            self.stream.write(" ... ")
-            self.stream.flush()
+        if not self.showAll:
+            return
+
+        # the test already ran, its outcome is written right after by the test results: no need to flush here
+        self.stream.write(self.getDescription(test))
+        self.stream.write(" ... ")
 
     def addError(self, test, err):
         """
@@ -282,34 +428,111 @@ class ResultCollector(threading.Thread, unittest.result.TestResult):
         """
         processes entries in the queue until told to stop
         """
-        while not self.cleanup:
+        try:
+            while True:
+                message = self.result_queue.get()
+
+                if message is None:  # sent by end_collection
+                    break
+
+                index = None
+                try:
+                    index, results, finished = ForkingPickler.loads(message)
+
+                    for result, test, additional_info in results:
+                        self.process_result(index, result, test, additional_info)
+
+                    if finished:
+                        self.finished_suites.add(index)
+                except Exception:  # a bad message must not stop the collection of all the others
+                    self.collection_errors[index] = sys.exc_info()
+        except Exception:  # the collection stopped early, results of all unfinished suites are lost
+            self.collection_errors[None] = sys.exc_info()
+
+    def process_result(self, index, result, test, additional_info) -> None:
+        """
+        registers a result received from the queue
+
+        :param index: index of the suite the result comes from
+        :param result: name of the state of the test
+        :param test: the test, unused in case of serialization failure
+        :param additional_info: additional information about the result
+        """
+        if result == TestState.serialization_failure.name:
+            warnings.warn("Serialization error: {} on test {}".format(
+                additional_info, self.tests[index]), SerializationWarning)
+
+            tests = self.unreported_tests(index)
+            if tests:
+                unittest.TestSuite(tests)(self)
+            else:  # only results of the suite's fixtures were left, they can't be run again on their own
+                error = PicklingError(additional_info)
+                self.add_suite_error(index, (PicklingError, error, None))
+
+        else:
             try:
-                result, test, additional_info = self.result_queue.get(timeout=1)
-            except queue.Empty:
-                continue
+                handler = self.result_handlers[result]
+            except KeyError:
+                raise Exception("This is not a valid test type :", result)
+
+            handler(test, additional_info)
 
-            self.result_queue.task_done()
+            # only count the test once handled, a test for which handling failed is reported with the error
+            self.testsRun += 1
+            self.reported_tests[index].add(test.id())
 
-            if result == TestState.serialization_failure:
-                test = self.tests[test]
-                warnings.warn("Serialization error: {} on test {}".format(
-                    additional_info, test), SerializationWarning)
-                test(self)
+    def report_unfinished_suites(self, exit_codes) -> None:
+        """
+        registers an error for every test of the suites for which not all results could be collected, either
+        because their process stopped before sending them or because the collection failed.
+        This must be called once the collection is over
 
+        :param exit_codes: exit code of the process that ran each suite, by index of the suite
+        """
+        for index, exit_code in sorted(exit_codes.items()):
+            if index in self.collection_errors:  # results were received, but failed to be registered
+                error = self.collection_errors[index]
+            elif index in self.finished_suites and not exit_code:
+                continue  # a process failing after its last test might have lost results of the suite's fixtures
+            elif None in self.collection_errors:  # the collection stopped or failed before knowing the suite
+                error = self.collection_errors[None]
             else:
+                crash = ProcessCrashError(
+                    "The process running the suite stopped with exit code {} before sending this result".format(
+                        exit_code
+                    )
+                )
+                error = (ProcessCrashError, crash, None)
+
+            tests = self.unreported_tests(index)
+            for test in tests:
                 self.testsRun += 1
+                self.addError(test, error)
 
-                if result == TestState.success:
-                    self.addSuccess(test)
-                elif result == TestState.failure:
-                    self.addFailure(test, additional_info)
-                elif result == TestState.error:
-                    self.addError(test, additional_info)
-                elif result == TestState.skipped:
-                    self.addSkip(test, additional_info)
-                elif result == TestState.expected_failure:
-                    self.addExpectedFailure(test, additional_info)
-                elif result == TestState.unexpected_success:
-                    self.addUnexpectedSuccess(test)
-                else:
-                    raise Exception("This is not a valid test type :", result)
+            if not tests:  # the results missing are of the suite's fixtures
+                self.add_suite_error(index, error)
+
+    def unreported_tests(self, index) -> list:
+        """
+        gets the tests of a suite for which no result was received
+
+        :param index: index of the suite
+        :return: list of the tests without results
+        """
+        reported_tests = self.reported_tests[index]
+        return [test for test in iter_test_cases(self.tests[index]) if test.id() not in reported_tests]
+
+    def add_suite_error(self, index, error) -> None:
+        """
+        registers an error for a whole suite, the way unittest reports errors of fixtures
+
+        :param index: index of the suite
+        :param error: tuple of the form (Exception class, Exception instance, traceback) to report
+        """
+        classes = sorted({
+            "{}.{}".format(test.__class__.__module__, test.__class__.__qualname__)
+            for test in iter_test_cases(self.tests[index])
+        })
+        # noinspection PyProtectedMember
+        suite_error = unittest.suite._ErrorHolder("fixtures ({})".format(", ".join(classes)))
+        self.addError(suite_error, error)
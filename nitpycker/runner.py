@@ -3,12 +3,11 @@ This modules implements a Parallel test runner for unittest
 """
 from pickle import PicklingError
 
-import collections
+import collections.abc
 import multiprocessing
-import multiprocessing.managers
+import multiprocessing.connection
 import queue
 import sys
-import threading
 import time
 import unittest
 # noinspection PyProtectedMember
@@ -20,6 +19,13 @@ from nitpycker.result import InterProcessResult, ResultCollector, TestState
 __author__ = "Benjamin Schubert, ben.c.schubert@gmail.com"
 
 
+# whenever possible, fork the workers so that they inherit the tests to run instead of having them serialized
+if "fork" in multiprocessing.get_all_start_methods():
+    multiprocessing_context = multiprocessing.get_context("fork")
+else:  # pragma: nocover
+    multiprocessing_context = multiprocessing.get_context()
+
+
 class TestClassNotIterable(Exception):
     """
     Exception thrown when a testClass, that should be iterable
@@ -43,6 +49,8 @@ class ParallelRunner:
     :param warnings: warning filter that should be used while running the tests
     :param tb_locals: if true, local variables will be shown in tracebacks
     :param process_number: number of processes to use for running the tests
+    :param tests_per_process: maximum number of tests of a same class to run in each process. Grouping tests
+            saves a process per test, but tests of a group are no longer isolated from each other
     """
     # TODO implement buffering
     # TODO implement failfast
@@ -51,7 +59,7 @@ class ParallelRunner:
     resultclass = (TextTestResult,)
     result_collector_class = ResultCollector
 
-    class Process(multiprocessing.Process):
+    class Process(multiprocessing_context.Process):
         """
         A simple test runner for a TestSuite.
 
@@ -59,29 +67,26 @@ class ParallelRunner:
         :param test: the unittest.TestSuite to run
         :param results_queue: a queue where to put the results once done
         :param manager: the plugin manager to be called before and after the run
-        :param task_done_notifier: semaphore to acquire to notify from end of task
         :param kwargs: additional arguments to pass to the process
         """
-        def __init__(self, index: int, test: unittest.TestSuite, results_queue: queue.Queue,
-                     task_done_notifier: threading.Semaphore, **kwargs):
+        def __init__(self, index: int, test: unittest.TestSuite, results_queue: queue.Queue, **kwargs):
             super().__init__(**kwargs)
             self.index = index
             self.test = test
-            self.results = InterProcessResult(results_queue)
+            self.results = InterProcessResult(results_queue, index, test.countTestCases())
             self.results_queue = results_queue
-            self.task_done = task_done_notifier
 
         def run(self) -> None:
             """ Launches the test and notifies of the result """
             try:
                 self.test(self.results)
-            except (PicklingError, TypeError) as exc:  # PicklingError is in Python 3.4, TypeError in Python 3.5
-                self.results_queue.put((TestState.serialization_failure, self.index, exc))
-            finally:
-                self.task_done.release()
+                self.results.flush(finished=True)
+            except PicklingError as exc:
+                # only the message is needed, don't risk failing to serialize the exception itself
+                self.results.send([(TestState.serialization_failure.name, None, str(exc))], True)
 
     def __init__(self, stream=None, descriptions=True, verbosity=1, failfast=False, buffer=False, resultclass=None,
-                 warnings=None, *, tb_locals=False, process_number=multiprocessing.cpu_count(),
+                 warnings=None, *, tb_locals=False, process_number=multiprocessing.cpu_count(), tests_per_process=1,
                  result_collector_class=None):
         if stream is None:
             stream = sys.stderr
@@ -93,10 +98,14 @@ class ParallelRunner:
         self.tb_locals = tb_locals
         self.warnings = warnings
 
+        if tests_per_process < 1:
+            raise ValueError("tests_per_process must be at least 1, got {}".format(tests_per_process))
+
         self.process_number = process_number
+        self.tests_per_process = tests_per_process
 
         if resultclass is not None:
-            if isinstance(resultclass, collections.Iterable):
+            if isinstance(resultclass, collections.abc.Iterable):
                 self.resultclass = resultclass
             else:
                 self.resultclass = (resultclass,)
@@ -125,13 +134,16 @@ class ParallelRunner:
                 if isinstance(test_class, unittest.loader._FailedTest):
                     continue
 
-            if not isinstance(test_class, collections.Iterable):  # likely an import failure in python 3.4.4-
+            try:
+                test_cases = iter(test_class)
+            except TypeError:  # likely an import failure in python 3.4.4-
                 # before python 3.4.5, test import failures were not serializable.
                 # We are unable to be sure that this is a module import failure, but it very likely is
                 # if this is the case, we'll just run this locally and see
                 raise TestClassNotIterable()
 
-            for test_case in test_class:
+            test_case = next(test_cases, None)
+            if test_case is not None:
                 return not getattr(sys.modules[test_case.__module__], "__no_parallel__", False)
 
     @staticmethod
@@ -142,15 +154,15 @@ class ParallelRunner:
         :param test_class: the class to run
         :return: True if te class can be run in parallel, False otherwise
         """
-        for test_case in test_class:
-            return not getattr(test_case, "__no_parallel__", False)
+        test_case = next(iter(test_class), None)
+        return test_case is None or not getattr(test_case, "__no_parallel__", False)
 
     def collect_tests(self, tests):
         """
         split all tests into chunks to be executed on multiple processes
 
         :param tests: tests that need to be run
-        :return: list of tests suites, test that need to be run locally
+        :return: list of tests suites, biggest first, test that need to be run locally
         """
 
         test_suites = []
@@ -172,10 +184,13 @@ class ParallelRunner:
                     test_suites.append(test_class)
                     continue
 
-                for _test in test_class:
-                    test_suite = unittest.TestSuite()
-                    test_suite.addTest(_test)
-                    test_suites.append(test_suite)
+                class_tests = list(test_class)
+                for start in range(0, len(class_tests), self.tests_per_process):
+                    test_suites.append(unittest.TestSuite(class_tests[start:start + self.tests_per_process]))
+
+        # start the biggest suites (modules and classes that can't run in parallel) first,
+        # so that they don't end up running alone at the end while other processes are idle
+        test_suites.sort(key=lambda suite: suite.countTestCases(), reverse=True)
 
         return test_suites, local_test_suites
 
@@ -225,10 +240,9 @@ class ParallelRunner:
         :return: a summary of the test run
         """
         start_time = time.time()
-        process = []
-        resource_manager = multiprocessing.Manager()
-        results_queue = resource_manager.Queue()
-        tasks_running = resource_manager.BoundedSemaphore(self.process_number)
+        running_processes = {}
+        exit_codes = {}
+        results_queue = multiprocessing_context.SimpleQueue()
 
         test_suites, local_test_suites = self.collect_tests(test)
 
@@ -241,20 +255,29 @@ class ParallelRunner:
         results_collector.start()
 
         for index, suite in enumerate(test_suites):
-            tasks_running.acquire()
-            x = self.Process(index, suite, results_queue, tasks_running)
+            while len(running_processes) >= self.process_number:
+                # waiting on the processes' sentinels also frees the slot of a process that crashed
+                for sentinel in multiprocessing.connection.wait(list(running_processes)):
+                    process = running_processes.pop(sentinel)
+                    process.join()
+                    exit_codes[process.index] = process.exitcode
+
+            x = self.Process(index, suite, results_queue)
             x.start()
-            process.append(x)
+            running_processes[x.sentinel] = x
 
         local_test_suites.run(results_collector)
 
-        for i in process:
-            i.join()
+        for process in running_processes.values():
+            process.join()
+            exit_codes[process.index] = process.exitcode
 
-        results_queue.join()
         results_collector.end_collection()
         results_collector.join()
 
+        # a process that crashed or got killed never told that its suite was done, its tests must not pass silently
+        results_collector.report_unfinished_suites(exit_codes)
+
         results_collector.printErrors()
         self.print_summary(results_collector, time.time() - start_time)
 
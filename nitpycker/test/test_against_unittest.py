@@ -6,11 +6,11 @@ of unittest in cases where no multiprocessing is involved
 """
 
 
+import textwrap
 import unittest
 import warnings
 
 import os
-import re
 
 from nitpycker.result import SerializationWarning
 from nitpycker.runner import ParallelRunner
@@ -35,6 +35,25 @@ test_args = [
 ]
 
 
+# serialization failures are expected in some samples, the filter is installed once for the whole module
+warnings_context = None
+
+
+# noinspection PyPep8Naming
+def setUpModule():
+    """ silences serialization warnings, saving the warnings state to restore it after the module's tests """
+    global warnings_context
+    warnings_context = warnings.catch_warnings()
+    warnings_context.__enter__()
+    warnings.simplefilter("ignore", SerializationWarning)
+
+
+# noinspection PyPep8Naming
+def tearDownModule():
+    """ restores the warnings state saved in setUpModule """
+    warnings_context.__exit__(None, None, None)
+
+
 def get_function_name(file, kwargs):
     """
     given a file and the arguments of the program, this will create a meaningful name
@@ -44,10 +63,10 @@ def get_function_name(file, kwargs):
     :param kwargs: arguments to pass to the test runner
     :return: name of the function to use
     """
-    return "test_{}{}".format(
-            os.path.splitext(file)[0].replace("check_", ""),
-            "_" + "_".join(["{}_{}".format(key, value) for key, value in kwargs.items()] if len(kwargs) else "")
-        ).strip("_")
+    name = "test_{}".format(os.path.splitext(file)[0].replace("check_", ""))
+    arguments = "_".join("{}_{}".format(key, value) for key, value in kwargs.items())
+
+    return "{}_{}".format(name, arguments) if arguments else name
 
 
 def set_function(cls, function_name, func):
@@ -74,24 +93,36 @@ class UnittestComparisonTest(unittest.TestCase):
         :param unittest_output: output gained from unittest
         :param nitpycker_output: output gained from nitpycker
         """
-        in1 = unittest_output - nitpycker_output
-        in2 = nitpycker_output - unittest_output
-
-        if any([in1, in2]):  # pragma: nocover
+        if unittest_output ^ nitpycker_output:  # pragma: nocover
+            in1 = unittest_output - nitpycker_output
+            in2 = nitpycker_output - unittest_output
             err_message = "The two outputs are not the same:\n"
 
             if in1:
-                err_message += "\tItems from unittest but not in nitpycker:\n\t\t{}\n\n".format(
-                    "\n".join(in1).replace("\n", "\n\t\t").strip("\n\t")
+                err_message += "\tItems from unittest but not in nitpycker:\n{}\n\n".format(
+                    textwrap.indent("\n".join(in1).strip("\n"), "\t\t")
                 )
 
             if in2:
-                err_message += "\tItems from nitpycker but not in unittest:\n\t\t{}\n".format(
-                    "\n".join(in2).replace("\n", "\n\t\t").strip("\n\t")
+                err_message += "\tItems from nitpycker but not in unittest:\n{}\n".format(
+                    textwrap.indent("\n".join(in2).strip("\n"), "\t\t")
                 )
 
             self.fail(err_message)
 
+    def extract_time_spent(self, output):
+        """
+        Extracts the "Ran N tests in X.XXXs" line from the output, as the time spent differs between runs
+
+        :param output: output of the test
+        :return: tuple containing the output without the time spent and the line giving it
+        """
+        start = output.rfind("\nRan ") + 1
+        self.assertNotEqual(start, 0, "The output does not tell how many tests were run")
+        end = output.index("\n", start)
+
+        return output[:start] + output[end:], output[start:end]
+
     @staticmethod
     def extract_headers(output, verbosity):
         """
@@ -99,14 +130,16 @@ class UnittestComparisonTest(unittest.TestCase):
 
         :param output: output of the test
         :param verbosity: verbosity used to run the test
-        :return: tuple containing the headers and the rest of the output
+        :return: tuple containing the headers and the list of blocks composing the rest of the output
         """
         if verbosity == 1:
-            return output.split("\n", 1)
+            headers, output = output.split("\n", 1)
+            return headers, output.split("\n\n")
         elif verbosity == 2:
-            return output.split("\n\n", 1)
+            parts = output.split("\n\n")
+            return parts[0], parts[1:]
 
-        return "", output
+        return "", output.split("\n\n")
 
     def compare_headers(self, unittest_headers, nitpycker_headers, verbosity):
         """
@@ -117,9 +150,10 @@ class UnittestComparisonTest(unittest.TestCase):
         :param verbosity: verbosity used for the test
         """
         if verbosity == 1:
-            self.assertCountEqual(unittest_headers, nitpycker_headers)
+            if unittest_headers != nitpycker_headers:  # results may come in another order when run in parallel
+                self.assertEqual(sorted(unittest_headers), sorted(nitpycker_headers))
         elif verbosity == 2:
-            self.assertCountEqual(unittest_headers.split("\n"), nitpycker_headers.split("\n"))
+            self.assertEqual(sorted(unittest_headers.split("\n")), sorted(nitpycker_headers.split("\n")))
         else:
             self.assertEqual(unittest_headers, nitpycker_headers)
 
@@ -132,27 +166,21 @@ class UnittestComparisonTest(unittest.TestCase):
         :param verbosity: verbosity with which the test
         :param kwargs: additional arguments to pass to the test runners
         """
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", SerializationWarning)
-            result1, unittest_output = run_tests(test_pattern, verbosity=verbosity, **kwargs)
-            result2, nitpycker_output = run_tests(test_pattern, test_runner=ParallelRunner, verbosity=verbosity, **kwargs)
-
-        regex_time_spent = r'Ran \d+ test(s)? in \d+\.\d+s'
-        unittest_time = re.search(regex_time_spent, unittest_output)
-        nitpycker_time = re.search(regex_time_spent, nitpycker_output)
+        result1, unittest_output = run_tests(test_pattern, verbosity=verbosity, **kwargs)
+        result2, nitpycker_output = run_tests(test_pattern, test_runner=ParallelRunner, verbosity=verbosity, **kwargs)
 
-        unittest_output = unittest_output[:unittest_time.start()] + unittest_output[unittest_time.end():]
-        nitpycker_output = nitpycker_output[:nitpycker_time.start()] + nitpycker_output[nitpycker_time.end():]
+        unittest_output, unittest_time = self.extract_time_spent(unittest_output)
+        nitpycker_output, nitpycker_time = self.extract_time_spent(nitpycker_output)
 
-        unittest_headers, unittest_output = self.extract_headers(unittest_output, verbosity)
-        nitpycker_headers, nitpycker_output = self.extract_headers(nitpycker_output, verbosity)
+        unittest_headers, unittest_parts = self.extract_headers(unittest_output, verbosity)
+        nitpycker_headers, nitpycker_parts = self.extract_headers(nitpycker_output, verbosity)
 
-        self.compare_outputs(set(unittest_output.split("\n\n")), set(nitpycker_output.split("\n\n")))
+        self.compare_outputs(set(unittest_parts), set(nitpycker_parts))
         self.compare_headers(unittest_headers, nitpycker_headers, verbosity)
         self.assertEqual(result1, result2, "Didn't get the same return codes")
 
         self.assertEqual(
-            unittest_time.group(0).split(" ")[1], nitpycker_time.group(0).split(" ")[1],
+            unittest_time.split(" ", 2)[1], nitpycker_time.split(" ", 2)[1],
             msg="The number of tests ran by unittest and NitPycker is not the same"
         )
 
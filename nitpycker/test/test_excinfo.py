@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the serializable versions of the execution information
+"""
+
+
+import pickle
+import sys
+import traceback
+import unittest
+
+from nitpycker.excinfo import FrozenExcInfo
+
+
+__author__ = "Benjamin Schubert, ben.c.schubert@gmail.com"
+
+
+def raise_at_depth(depth):
+    """
+    raises an exception after recursing the given number of times
+
+    :param depth: number of frames to add to the traceback
+    """
+    if depth:
+        raise_at_depth(depth - 1)
+    raise ValueError("Deep error")
+
+
+class FrozenExcInfoTest(unittest.TestCase):
+    """
+    Tests that frozen execution information can go through pickle and still be reported
+    """
+    @staticmethod
+    def freeze(exc_info):
+        return pickle.loads(pickle.dumps(FrozenExcInfo(exc_info)))
+
+    def test_deep_traceback(self):
+        depth = sys.getrecursionlimit() - 100
+
+        try:
+            raise_at_depth(depth)
+        except ValueError:
+            exc_info = self.freeze(sys.exc_info())
+
+        # this test's frame, then one per call to raise_at_depth
+        self.assertEqual(len(list(traceback.walk_tb(exc_info[2]))), depth + 2)
+        self.assertTrue("".join(traceback.format_exception(*exc_info)).endswith("ValueError: Deep error\n"))
+
+    def test_failure_report(self):
+        # assertEqual adds frames from unittest to the traceback, that the test result cuts off
+        try:
+            self.assertEqual(1, 2)
+        except AssertionError:
+            exc_info = self.freeze(sys.exc_info())
+
+        result = unittest.TestResult()
+        result.addFailure(self, exc_info)
+
+        self.assertIn("self.assertEqual(1, 2)", result.failures[0][1])
+        self.assertIn("AssertionError: 1 != 2", result.failures[0][1])
+        self.assertNotIn("unittest", result.failures[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,11 @@ Tests specifics to the use of multiprocessing for NitPycker
 
 
 import unittest
+import unittest.mock
+import warnings
+from unittest.runner import TextTestResult
 
+from nitpycker.result import InterProcessResult, SerializationWarning
 from nitpycker.runner import ParallelRunner
 from nitpycker.test import NUMBER_OF_PROCESS, run_tests
 
@@ -42,6 +46,62 @@ class MultiprocessingTests(unittest.TestCase):
 
         self.check_error("OK", output, result)
 
+    def test_process_crash(self):
+        # send each result as soon as possible, to check that those sent before the crash are kept
+        with unittest.mock.patch.object(InterProcessResult, "results_per_flush", 1):
+            result, output = run_tests(
+                "check_process_crash.py", test_runner=ParallelRunner, process_number=NUMBER_OF_PROCESS)
+
+        self.assertIn("Ran 4 tests", output)
+        self.assertEqual(output.count("ProcessCrashError"), 3)
+        self.assertIn("FAILED (errors=3)", output)
+        self.assertFalse(result)
+
+    def test_serialization_failure(self):
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter("always", SerializationWarning)
+            result, output = run_tests(
+                "check_unserializable.py", test_runner=ParallelRunner, process_number=NUMBER_OF_PROCESS)
+
+        self.assertEqual(
+            [warning.category for warning in caught_warnings].count(SerializationWarning), 2, caught_warnings
+        )
+        # the tests were run again locally, where their errors can be reported
+        self.assertIn("UnserializableError: This exception holds a lock", output)
+        self.assertIn("UnloadableError: This exception can't be loaded back", output)
+        self.assertIn("FAILED (errors=2)", output)
+        self.assertFalse(result)
+
+    def test_collection_error(self):
+        class BrokenResult(TextTestResult):
+            def addSuccess(self, test):
+                raise RuntimeError("Broken result")
+
+        result, output = run_tests(
+            "check_isolation.py", test_runner=ParallelRunner, process_number=NUMBER_OF_PROCESS, resultclass=BrokenResult
+        )
+
+        # the processes did their job, the error is the collector's
+        self.assertEqual(output.count("RuntimeError: Broken result"), 2)
+        self.assertNotIn("ProcessCrashError", output)
+        self.assertIn("FAILED (errors=2)", output)
+        self.assertFalse(result)
+
+    def test_tests_per_process(self):
+        result, output = run_tests(
+            "check_tests_per_process.py", test_runner=ParallelRunner, process_number=NUMBER_OF_PROCESS,
+            tests_per_process=2, verbosity=2
+        )
+
+        # the second test only passes when it runs in the same process as the first one
+        self.assertEqual(output.count(" ... ok"), 2)
+        self.check_error("OK", output, result)
+
+    def test_invalid_tests_per_process(self):
+        for tests_per_process in (0, -1):
+            with self.assertRaises(ValueError):
+                ParallelRunner(tests_per_process=tests_per_process)
+
 
 if __name__ == "__main__":
     unittest.main()
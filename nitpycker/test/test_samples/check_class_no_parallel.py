@@ -12,7 +12,10 @@ __author__ = "Benjamin Schubert <ben.c.schubert@gmail.com>"
 
 class Holder:
     """ dummy container """
-    value = True
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = True
 
 
 class NoParallelClass(unittest.TestCase):
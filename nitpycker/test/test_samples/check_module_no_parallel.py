@@ -14,7 +14,10 @@ __no_parallel__ = True
 
 class Holder:
     """ dummy container """
-    value = True
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = True
 
 
 holder = Holder()
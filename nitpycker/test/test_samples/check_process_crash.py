@@ -0,0 +1,26 @@
+"""
+Test that tests of a process that died before sending their results are reported as errors
+"""
+
+
+import os
+import unittest
+
+
+__author__ = "Benjamin Schubert, ben.c.schubert@gmail.com"
+
+__no_parallel__ = True
+
+
+class CrashingProcess(unittest.TestCase):
+    def test_1_success(self):
+        pass
+
+    def test_2_crash(self):
+        os._exit(0)
+
+    def test_3_success(self):
+        pass
+
+    def test_4_success(self):
+        pass
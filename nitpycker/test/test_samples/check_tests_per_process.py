@@ -0,0 +1,23 @@
+"""
+Tests that only pass when run in the same process, to check that NitPycker can group tests of a class
+"""
+
+
+import unittest
+
+
+__author__ = "Benjamin Schubert, ben.c.schubert@gmail.com"
+
+
+class GroupedClass(unittest.TestCase):
+    value = 0
+
+    @classmethod
+    def setUp(cls):
+        cls.value += 1
+
+    def test_one(self):
+        self.assertEqual(self.value, 1)
+
+    def test_two(self):
+        self.assertEqual(self.value, 2)
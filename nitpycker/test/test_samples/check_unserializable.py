@@ -1,5 +1,5 @@
 """
-This checks that a non-serializable test is indeed reported
+This checks that a test whose results can't be serialized is indeed reported
 """
 
 
@@ -10,6 +10,24 @@ import threading
 __author__ = "Benjamin Schubert <ben.c.schubert@gmail.com>"
 
 
+class UnserializableError(Exception):
+    """ exception holding a lock, which can't be serialized """
+    def __init__(self):
+        super().__init__("This exception holds a lock")
+        self.lock = threading.Lock()
+
+
 class SerializationTest(unittest.TestCase):
     def test_serialization(self):
-        self.l = threading.Lock()
+        raise UnserializableError()
+
+
+class UnloadableError(Exception):
+    """ exception that can be serialized, but not loaded back as it needs more than its message """
+    def __init__(self, first, second):
+        super().__init__("{} {}".format(first, second))
+
+
+class LoadingTest(unittest.TestCase):
+    def test_loading(self):
+        raise UnloadableError("This exception can't be", "loaded back")